@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #-------------------------------------------------------------------------------
 # Name:        nsmcli
@@ -18,15 +18,177 @@
 # Version: V1.0
 # Release control:
 #                08/06/2013 - First release
+#                19/10/2026 - Typed results, NSMError exceptions and batch quarantine operations
+#                19/10/2026 - Python 3 port
+#                19/10/2026 - Profiling mode
+#                19/10/2026 - Quarantine ingestion from syslog and webhook events
 #
 #-------------------------------------------------------------------------------
 import requests
 import sys
 import argparse
+import contextlib
+import functools
+import ipaddress
+import queue
+import re
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 requests.packages.urllib3.disable_warnings()
 
-class nsm(object):
+# Error codes carried by NSMError.code
+ERR_CONNECTION          = 'HTTP_CONNECTION'
+ERR_TIMEOUT             = 'HTTP_TIMEOUT'
+ERR_REDIRECTS           = 'HTTP_TOO_MANY_REDIRECTS'
+ERR_BAD_RESPONSE        = 'HTTP_BAD_RESPONSE'
+ERR_HTTP_STATUS         = 'HTTP_STATUS'
+ERR_UNEXPECTED          = 'HTTP_UNEXPECTED'
+ERR_SENSOR_UNAVAILABLE  = 'SENSOR_UNAVAILABLE'
+ERR_UNKNOWN_SENSOR      = 'UNKNOWN_SENSOR'
+ERR_UNSUPPORTED_SENSOR  = 'UNSUPPORTED_SENSOR'
+ERR_ALREADY_QUARANTINED = 'ALREADY_QUARANTINED'
+ERR_NOT_QUARANTINED     = 'NOT_QUARANTINED'
+
+# Quarantine periods accepted by the NSM-SDK-API, in minutes
+QUARANTINE_DURATIONS = {15:'FIFTEEN_MINUTES',30:'THIRTY_MINUTES',45:'FORTYFIVE_MINUTES',60:'SIXTY_MINUTES',
+                        240:'FOUR_HOURS',480:'EIGHT_HOURS',720:'TWELVE_HOURS',960:'SIXTEEN_HOURS',
+                        999:'UNTIL_EXPLICITLY_RELEASED'}
+
+# Only M and NS series are supported
+SUPPORTED_MODELS = frozenset(['M-8000','M-6050','M-4050','M-2950','M-2850','M-2750','M-1450','M-1250',
+                              'NS-9100','NS-9200','NS-9300'])
+
+class NSMError(Exception):
+    '''
+    
+    Description: Error raised by the nsm class
+    
+    Input      : Error code (one of the ERR_* constants), error message and,
+                 for HTTP output errors, the HTTP status code
+    
+    Use        : To be used as a public interface
+    '''
+    def __init__(self, code, message, status_code=None):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+class Sensor:
+    '''
+    
+    Description: Sensor managed by Network Security Manager
+    
+    Use        : To be used as a public interface
+    '''
+    __slots__ = ('sensor_id', 'name', 'model', 'ip_address', 'software_version', 'sigset_version')
+    
+    def __init__(self, sensor_id, name=None, model=None, ip_address=None, software_version=None, sigset_version=None):
+        self.sensor_id        = sensor_id
+        self.name             = name
+        self.model            = model
+        self.ip_address       = ip_address
+        self.software_version = software_version
+        self.sigset_version   = sigset_version
+        
+    @classmethod
+    def from_api(cls, entry):
+        '''
+        
+        Description: Build a Sensor from a NSM-SDK-API sensor descriptor entry
+        
+        Input      : Dictionary with the NSM-SDK-API sensor information
+        
+        Output     : Sensor object
+        
+        Use        : To be used internally in the module
+        '''
+        return cls(entry['sensorId'], entry.get('name'), entry.get('model'), entry.get('sensorIPAddress'),
+                   entry.get('SoftwareVersion'), entry.get('SigsetVersion'))
+        
+    def __repr__(self):
+        return 'Sensor(%r, %r, %r)' % (self.sensor_id, self.name, self.model)
+
+class QuarantineEntry:
+    '''
+    
+    Description: Host in the quarantine area of a sensor
+    
+    Use        : To be used as a public interface
+    '''
+    __slots__ = ('ip_address', 'duration')
+    
+    def __init__(self, ip_address, duration):
+        self.ip_address = ip_address
+        self.duration   = duration
+        
+    def __repr__(self):
+        return 'QuarantineEntry(%r, %r)' % (self.ip_address, self.duration)
+
+class QuarantineResult:
+    '''
+    
+    Description: Outcome of a quarantine or release operation for one IP address on one sensor.
+                 ok is True on success, otherwise code and status_code hold the NSMError code
+                 and HTTP status code of the failure.
+    
+    Use        : To be used as a public interface
+    '''
+    __slots__ = ('ip_address', 'sensor_id', 'ok', 'message', 'code', 'status_code')
+    
+    def __init__(self, ip_address, sensor_id, ok, message, code=None, status_code=None):
+        self.ip_address  = ip_address
+        self.sensor_id   = sensor_id
+        self.ok          = ok
+        self.message     = message
+        self.code        = code
+        self.status_code = status_code
+        
+    @classmethod
+    def failure(cls, ip_address, sensor_id, error):
+        return cls(ip_address, sensor_id, False, error.message, error.code, error.status_code)
+        
+    def __repr__(self):
+        return 'QuarantineResult(%r, %r, %r, %r)' % (self.ip_address, self.sensor_id, self.ok, self.message)
+
+class BatchResult:
+    '''
+    
+    Description: Aggregated QuarantineResult objects of a batch operation
+    
+    Use        : To be used as a public interface
+    '''
+    __slots__ = ('results',)
+    
+    def __init__(self, results):
+        self.results = results
+        
+    def __iter__(self):
+        return iter(self.results)
+    
+    def __len__(self):
+        return len(self.results)
+    
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.ok]
+    
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+    
+    @property
+    def ok(self):
+        return all(result.ok for result in self.results)
+        
+    def __repr__(self):
+        return 'BatchResult(%d succeeded, %d failed)' % (len(self.succeeded), len(self.failed))
+
+class nsm:
     '''
     classdocs
     '''
@@ -47,6 +209,11 @@ class nsm(object):
         self.sessionheader = {}
         self.sensors_raw = {}
         self.sensors_id = []
+        self.sensors = {}
+        self.credentials = None
+        
+        # A single session keeps the HTTPS connection to the NSM alive between requests
+        self.session = requests.Session()
         
     def connect(self, user, password):
         ''' 
@@ -55,7 +222,7 @@ class nsm(object):
         
         Input      : User name and password strings
         
-        Output     : Session header + Error Control
+        Output     : Session header. Raises NSMError on failure
         
         Use        : To be used as a public interface
         '''
@@ -65,25 +232,37 @@ class nsm(object):
                       'NSM-SDK-API': '%s'
                       % self.b64(user,password)
                       }
-        r = self.request_connect('get', 'https://%s/sdkapi/session' % self.nsmserver, authheader)
-        
-        if r[0] == 1:
-  
-            response = self.transform(r[1])
+        response = self.transform(self.request_connect('get', 'https://%s/sdkapi/session' % self.nsmserver, authheader))
         
+        try:
             sessionheader =  {
                               'Accept': 'application/vnd.nsm.v1.0+json',
                               'Content-Type': 'application/json',
                               'NSM-SDK-API': '%s'
                               % self.b64(response['session'], response['userId'])
                               }
-            self.sessionheader = sessionheader
-            
-            return (1,sessionheader)
-            
-        else:
-               
-            return r
+        except (KeyError, TypeError):
+            raise NSMError(ERR_BAD_RESPONSE, 'Unexpected NSM API session output: %s' % response)
+        self.sessionheader = sessionheader
+        self.credentials = (user, password)
+        
+        return sessionheader
+    
+    def reconnect(self):
+        ''' 
+        
+        Description: Open a new session with the credentials of the last connect, ie: when the
+                     NSM answers 401 because the session has expired
+        
+        Input      : No input
+        
+        Output     : Session header. Raises NSMError on failure
+        
+        Use        : To be used as a public interface
+        '''
+        if self.credentials is None:
+            raise NSMError(ERR_HTTP_STATUS, 'Not connected to Network Security Manager', 401)
+        return self.connect(*self.credentials)
          
     def disconnect(self):
         '''
@@ -92,34 +271,31 @@ class nsm(object):
         
         Input      : No input
         
-        Output     : Error control 
+        Output     : Dictionary with the NSM-SDK-API response. Raises NSMError on failure
         
         Use        : To be used as a public interface
         '''
         
-        r = self.request_connect('delete', 'https://%s/sdkapi/session' % self.nsmserver, self.sessionheader)
-        
-        if r[0] == 1:
-            return (1,self.transform(r[1]))
-        else:
-            return r
+        return self.transform(self.request_connect('delete', 'https://%s/sdkapi/session' % self.nsmserver, self.sessionheader))
                            
     def transform(self,r):
         ''' 
         
-        Description: Transform the NSM-SDK-API output to a Python dictionary with ASCII values
+        Description: Transform the NSM-SDK-API JSON output to a Python dictionary
         
         input      : Response object of NSM-SDK-API interface 
         
-        Output     : Dictionary with NSM-SDK-API information transformed
+        Output     : Dictionary with NSM-SDK-API information transformed. Raises NSMError if
+                     the output can not be parsed
         
         Use        : To be used internally in the class
         '''
-        import unicodedata
-        import ast
+        import json
         
-        string = unicodedata.normalize('NFKD', r.text).encode('ascii','ignore')
-        return ast.literal_eval(string)    
+        try:
+            return json.loads(r.text)
+        except ValueError:
+            raise NSMError(ERR_BAD_RESPONSE, 'Unexpected NSM API output: %s' % r.text)
     
     def b64(self,user,password):
         ''' 
@@ -134,7 +310,7 @@ class nsm(object):
         '''
         import base64
         authstring = user + ':' + password
-        return base64.b64encode(authstring)
+        return base64.b64encode(authstring.encode('utf-8')).decode('ascii')
     
     def request_connect(self,optype,url,header,payload=''):
         '''
@@ -147,55 +323,46 @@ class nsm(object):
                      Session header, obtained from the connect operation                     
                      payload, for those operations that require it
                      
-        Output     : Response NSM-SDK-API Object + Error Control
+        Output     : Response NSM-SDK-API Object. Raises NSMError on failure
         
         Use        : To be used as a public interface
         '''
         import json
 
-        if optype == 'get':
-            requeststring = "requests.get(url, headers = header, verify=False)"
-        elif optype == 'post':
-            requeststring = "requests.post(url, headers = header, verify=False, data=json.dumps(payload))"
-        elif optype == 'delete':
-            requeststring = "requests.delete(url, headers = header, verify=False)"
-            
         try:
-            r = eval(requeststring)
+            if optype == 'post':
+                r = self.session.post(url, headers = header, verify=False, data=json.dumps(payload))
+            else:
+                r = self.session.request(optype, url, headers = header, verify=False)
             
         except requests.exceptions.ConnectionError:
             # There is a connection Error
-            erroroutput = (0,'HTTP Connection Error')
-            return erroroutput
+            raise NSMError(ERR_CONNECTION, 'HTTP Connection Error')
             
         except requests.exceptions.Timeout:
             # Inform that the request has timeout
-            erroroutput = (0,'HTTP Request Time Out')
-            return erroroutput
+            raise NSMError(ERR_TIMEOUT, 'HTTP Request Time Out')
             
         except requests.exceptions.TooManyRedirects:
             # Inform that the request exceeds the configured number of maximum redirections
-            erroroutput = (0,'HTTP Too many redirects')
-            return erroroutput
+            raise NSMError(ERR_REDIRECTS, 'HTTP Too many redirects')
            
         except requests.exceptions.HTTPError:
             # In the event of the rare invalid HTTP response
-            erroroutput = (0,'HTTP Bad response')
-            return erroroutput
+            raise NSMError(ERR_BAD_RESPONSE, 'HTTP Bad response')
             
         except requests.exceptions.RequestException as e:
             # Unexpected error
-            erroroutput = (0,'HTTP Unexpected Error: %s' % e)
-            return erroroutput
+            raise NSMError(ERR_UNEXPECTED, 'HTTP Unexpected Error: %s' % e)
             
         # The following code raise an alert if the code received is 4XX client error or 5XX server Error
         try:
             r.raise_for_status()
             
         except requests.exceptions.HTTPError: #404 Client Error or 5xx Server error
-            erroroutput = (0, 'HTTP output error: %s NSM API output: %s' % (r.status_code, r.text))
-            return erroroutput
-        return (1,r)
+            raise NSMError(ERR_HTTP_STATUS, 'HTTP output error: %s NSM API output: %s' % (r.status_code, r.text),
+                           r.status_code)
+        return r
     
     def get_sensors(self):
         ''' 
@@ -204,49 +371,75 @@ class nsm(object):
         
         Input      : No input
         
-        Output     : Tuple with the NSM-SDK-API list of sensors + Error Control
+        Output     : List of Sensor objects. Raises NSMError on failure
         
         Use        : To be used as a public interface
         '''
         r = self.request_connect('get', 'https://%s/sdkapi/sensors' % self.nsmserver, self.sessionheader)
         
-        if r[0] == 1:
-               
-            self.sensors_raw = self.transform(r[1])
+        self.sensors_raw = self.transform(r)
         
-            # The following loop get the list of sensors Id manage by the NSM instead of returning
-            # the response obtained which has a json structure a prefer to just sent the list of
-            # sensors
-            self.sensors_id = [[each_sensor['sensorId'] for each_sensor in self.sensors_raw[descriptor]] for descriptor in self.sensors_raw][0]
-                       
-            return (1,self.sensors_raw)
-        else:
-            return r
+        # Only the first descriptor of the response carries the list of sensors
+        try:
+            sensors = [[Sensor.from_api(each_sensor) for each_sensor in self.sensors_raw[descriptor]] for descriptor in self.sensors_raw][0]
+        except (KeyError, IndexError, TypeError):
+            raise NSMError(ERR_BAD_RESPONSE, 'Unexpected NSM API sensors output: %s' % self.sensors_raw)
+        
+        self.sensors = dict((sensor.sensor_id, sensor) for sensor in sensors)
+        self.sensors_id = [sensor.sensor_id for sensor in sensors]
+                   
+        return sensors
     
     def get_qhosts(self, sensor_id): 
         ''' 
         
         Description: Get the list of quarantine hosts
         
-        Input      : Sensor Identification, optional to get the quarantine hosts from.
-                     If not specify all sensors will be considered
+        Input      : Sensor Identification to get the quarantine hosts from.
         
-        Output     : Tuple with the list of quarantine hosts + Error Control
+        Output     : List of QuarantineEntry objects. Raises NSMError on failure
         
         Use        : To be used as a public interface
         '''
+        self.check_sensor(sensor_id)
+        return self.fetch_qhosts(sensor_id)
     
-        temp = {}
+    def fetch_qhosts(self, sensor_id):
+        ''' 
         
-        if sensor_id in self.sensors_id and self.is_supportedsensor(sensor_id) and self.is_sensorup(sensor_id):
-                r = self.request_connect('get', 'https://%s/sdkapi/sensor/%d/action/quarantinehost' % (self.nsmserver, sensor_id), self.sessionheader)
-                if r[0] == 1:
-                    temp.update(self.transform(r[1]))
-                    q_hosts=[[(each_qentry['IPAddress'],each_qentry['Duration']) for each_qentry in temp[descriptor]] for descriptor in temp][0]
-                    return (1, q_hosts)
-                else:
-                    return r
-        return (0,"Sensor %s down, doesn't exit or model not supported" % sensor_id ) 
+        Description: Get the list of quarantine hosts without checking the sensor first
+        
+        Input      : Sensor Identification
+        
+        Output     : List of QuarantineEntry objects. Raises NSMError on failure
+        
+        Use        : To be used internally in the class
+        '''
+        r = self.request_connect('get', 'https://%s/sdkapi/sensor/%d/action/quarantinehost' % (self.nsmserver, sensor_id), self.sessionheader)
+        temp = self.transform(r)
+        try:
+            return [[QuarantineEntry(each_qentry['IPAddress'], each_qentry['Duration']) for each_qentry in temp[descriptor]] for descriptor in temp][0]
+        except (KeyError, IndexError, TypeError):
+            raise NSMError(ERR_BAD_RESPONSE, 'Unexpected NSM API quarantine hosts output: %s' % temp)
+    
+    def check_sensor(self, sensor_id):
+        ''' 
+        
+        Description: Check that the sensor is managed, supported and active
+        
+        Input      : Sensor identification
+        
+        Output     : No Output. Raises NSMError if the sensor can not be used
+        
+        Use        : To be used internally in the class
+        '''
+        if sensor_id not in self.sensors:
+            raise NSMError(ERR_UNKNOWN_SENSOR, 'Sensor %s not managed by Network Security Manager' % sensor_id)
+        if not self.is_supportedsensor(sensor_id):
+            raise NSMError(ERR_UNSUPPORTED_SENSOR, 'Sensor %s model %s not supported' % (sensor_id, self.sensors[sensor_id].model))
+        # Errors of the status request itself, ie: an expired session, are raised unchanged
+        if self.sensor_status(sensor_id) != 'ACTIVE':
+            raise NSMError(ERR_SENSOR_UNAVAILABLE, 'Sensor %s down' % sensor_id)
                 
     def is_supportedsensor(self,sensor_id):
         ''' 
@@ -260,12 +453,8 @@ class nsm(object):
         Use        : To be used internally in the class
         '''
         
-        supportedlist = ['M-8000','M-6050','M-4050','M-2950','M-2850','M-2750','M-1450','M-1250','NS-9100','NS-9200','NS-9300']
-        for descriptor in self.sensors_raw:
-            for each_entry in self.sensors_raw[descriptor]:
-                if each_entry['sensorId'] == sensor_id and each_entry['model'] in supportedlist:
-                    return True
-        return False
+        sensor = self.sensors.get(sensor_id)
+        return sensor is not None and sensor.model in SUPPORTED_MODELS
     
     def is_sensorup(self, sensor_Id):
         ''' 
@@ -278,14 +467,28 @@ class nsm(object):
         
         Use        : To be used internally in the class
         '''
-        r = self.request_connect('get', 'https://%s/sdkapi/sensor/%s/status' % (self.nsmserver,sensor_Id), self.sessionheader)
-        if r[0] == 1:
-            if self.transform(r[1])['status']=='ACTIVE':
-                return True
-            else:
-                return False
-        else:
+        try:
+            return self.sensor_status(sensor_Id)=='ACTIVE'
+        except NSMError:
             return False
+    
+    def sensor_status(self, sensor_Id):
+        ''' 
+        
+        Description: Get the status of the sensor
+        
+        Input      : Sensor identification
+        
+        Output     : Status string, ie: ACTIVE. Raises NSMError on failure
+        
+        Use        : To be used internally in the class
+        '''
+        r = self.request_connect('get', 'https://%s/sdkapi/sensor/%s/status' % (self.nsmserver,sensor_Id), self.sessionheader)
+        response = self.transform(r)
+        try:
+            return response['status']
+        except (KeyError, TypeError):
+            raise NSMError(ERR_BAD_RESPONSE, 'Unexpected NSM API sensor status output: %s' % response)
         
     def post_qhost(self, ip_address, sensor_id, duration=15):
         '''
@@ -294,57 +497,52 @@ class nsm(object):
         
         Input      : 
                      IP Address to be sent to quarantine
-                     Sensor identification, optional - to apply the quarantine operation.
-                     If not specify all sensors will be considered
+                     Sensor identification to apply the quarantine operation.
                      Duration, optional length of the quarantine operation. Possible values:
                      {15,30,45,60,240,480,720,960,999}
                      If not specify 15 minutes will be considered
                      
-        Output     : Error Control
+        Output     : QuarantineResult. Raises NSMError on failure
         
-        Use        : To be used internally in the class
+        Use        : To be used as a public interface
         '''
-       
-        temp = {}
+        self.check_sensor(sensor_id)
         
-                
-        time = {15:'FIFTEEN_MINUTES',30:'THIRTY_MINUTES',45:'FORTYFIVE_MINUTES',60:'SIXTY_MINUTES',
-                240:'FOUR_HOURS',480:'EIGHT_HOURS',720:'TWELVE_HOURS',960:'SIXTEEN_HOURS',
-                999:'UNTIL_EXPLICITLY_RELEASED'}
+        # Let's check first if the Ip address to quarantine is already in the quarantine area
+        quarantine_area = set(entry.ip_address for entry in self.fetch_qhosts(sensor_id))
+        
+        return self.send_qhost(ip_address, sensor_id, duration, quarantine_area)
+    
+    def send_qhost(self, ip_address, sensor_id, duration, quarantine_area):
+        '''
+        
+        Description: Send a host to quarantine on a sensor already checked
+        
+        Input      : 
+                     IP Address to be sent to quarantine
+                     Sensor identification
+                     Duration of the quarantine operation
+                     Set of IP addresses already quarantined on the sensor, updated on success
+                     
+        Output     : QuarantineResult. Raises NSMError on failure
+        
+        Use        : To be used internally in the class
+        '''
+        if ip_address in quarantine_area:
+            raise NSMError(ERR_ALREADY_QUARANTINED, "IP %s already quarantined" % ip_address)
         
-        if duration not in time: duration = 15
+        if duration not in QUARANTINE_DURATIONS: duration = 15
         
         payload = {
                  'IPAddress': '%s' % ip_address,
-                 'Duration': '%s'  % time[duration]
+                 'Duration': '%s'  % QUARANTINE_DURATIONS[duration]
                  }
         
-        # Let's check first if the Ip address to quarantine is already in the quarantine area
-        quarantine_area = []
-        qhosts = self.get_qhosts(sensor_id)
-        
-        if qhosts[0] == 0: return qhosts
+        self.request_connect('post', 'https://%s/sdkapi/sensor/%d/action/quarantinehost'
+                                     % (self.nsmserver, sensor_id), self.sessionheader, payload)
+        quarantine_area.add(ip_address)
         
-        for n in range(len(qhosts[1])):
-            quarantine_area.append(qhosts[1][n][0])
-                
-        if ip_address not in quarantine_area:
-        
-            if sensor_id in self.sensors_id and self.is_supportedsensor(sensor_id) and self.is_sensorup(sensor_id):
-                r = self.request_connect('post', 'https://%s/sdkapi/sensor/%d/action/quarantinehost'
-                                             % (self.nsmserver, sensor_id), self.sessionheader, payload)
-                if r[0] == 1:
-                    temp.update(self.transform(r[1]))
-                    response=(1,'IP %s quarantine for %s ' %(ip_address, time[duration]))
-                else:
-                    return r            
-               
-            else:
-                response=(0,"Sensor %s down, doesn't exit or model not supported" % sensor_id )  
-        else:
-            response=(0,"IP %s already quarantined" % ip_address)
-              
-        return response
+        return QuarantineResult(ip_address, sensor_id, True, 'IP %s quarantine for %s ' % (ip_address, QUARANTINE_DURATIONS[duration]))
         
     def delete_qhost(self, ip_address, sensor_id):
         '''
@@ -353,44 +551,704 @@ class nsm(object):
         
         Input      : 
                      IP Address to be delete from quarantine
-                     Sensor identification, optional - to apply the delete operation.
-                     If not specify all sensors will be considered
-
+                     Sensor identification to apply the delete operation.
                      
-        Output     : Error Control
+        Output     : QuarantineResult. Raises NSMError on failure
         
-        Use        : To be used internally in the class
+        Use        : To be used as a public interface
         '''
-        temp = {}
+        self.check_sensor(sensor_id)
         
         # Let's check first if the Ip address to delete is in the quarantine area
-        quarantine_area = []
+        quarantine_area = set(entry.ip_address for entry in self.fetch_qhosts(sensor_id))
         
-        qhosts = self.get_qhosts(sensor_id)
+        return self.release_qhost(ip_address, sensor_id, quarantine_area)
+    
+    def release_qhost(self, ip_address, sensor_id, quarantine_area):
+        '''
         
-        if qhosts[0] == 0: return qhosts
+        Description: Delete a host from quarantine on a sensor already checked
         
-        for n in range(len(qhosts[1])):
-            quarantine_area.append(qhosts[1][n][0])
+        Input      : 
+                     IP Address to be delete from quarantine
+                     Sensor identification
+                     Set of IP addresses quarantined on the sensor, updated on success
+                     
+        Output     : QuarantineResult. Raises NSMError on failure
         
-        if ip_address in quarantine_area:
-          
-            if sensor_id in self.sensors_id  and self.is_supportedsensor(sensor_id) and self.is_sensorup(sensor_id):
-                r = self.request_connect('delete', 'https://%s/sdkapi/sensor/%d/action/quarantinehost/%s' 
-                                                % (self.nsmserver, sensor_id, ip_address), self.sessionheader)
-                if r[0] == 1:
-                    temp.update(self.transform(r[1]))
-                    response=(1,"IP %s removed from quarantine" % ip_address)
-                else:
-                    return r
-
-            else:
-                response=(0,"Sensor %s down, doesn't exit or not supported" % sensor_id)
+        Use        : To be used internally in the class
+        '''
+        if ip_address not in quarantine_area:
+            raise NSMError(ERR_NOT_QUARANTINED, "IP %s not in quarantined" % ip_address)
+        
+        self.request_connect('delete', 'https://%s/sdkapi/sensor/%d/action/quarantinehost/%s' 
+                                       % (self.nsmserver, sensor_id, ip_address), self.sessionheader)
+        quarantine_area.discard(ip_address)
+        
+        return QuarantineResult(ip_address, sensor_id, True, "IP %s removed from quarantine" % ip_address)
+    
+    def quarantine_many(self, ips, sensors, duration=15):
+        '''
+        
+        Description: Send several hosts to quarantine on several sensors. Every sensor is checked
+                     and its quarantine area read only once for the whole batch.
+        
+        Input      : 
+                     List of IP Addresses to be sent to quarantine
+                     List of sensor identifications
+                     Duration, optional length of the quarantine operation. See post_qhost
                      
+        Output     : BatchResult with one QuarantineResult per IP address and sensor
+        
+        Use        : To be used as a public interface
+        '''
+        return self.run_batch(ips, sensors, lambda ip, sensor_id, area: self.send_qhost(ip, sensor_id, duration, area))
+    
+    def release_many(self, ips, sensors):
+        '''
+        
+        Description: Delete several hosts from quarantine on several sensors. Every sensor is checked
+                     and its quarantine area read only once for the whole batch.
+        
+        Input      : 
+                     List of IP Addresses to be deleted from quarantine
+                     List of sensor identifications
+                     
+        Output     : BatchResult with one QuarantineResult per IP address and sensor
+        
+        Use        : To be used as a public interface
+        '''
+        return self.run_batch(ips, sensors, self.release_qhost)
+    
+    def run_batch(self, ips, sensors, operation):
+        '''
+        
+        Description: Apply a quarantine operation to every IP address on every sensor, collecting
+                     the failures instead of raising them
+        
+        Input      : 
+                     List of IP Addresses
+                     List of sensor identifications
+                     Operation, called with IP address, sensor identification and quarantine area
+                     
+        Output     : BatchResult
+        
+        Use        : To be used internally in the class
+        '''
+        ips = list(ips)
+        results = []
+        
+        for sensor_id in sensors:
+            try:
+                self.check_sensor(sensor_id)
+                quarantine_area = set(entry.ip_address for entry in self.fetch_qhosts(sensor_id))
+            except NSMError as e:
+                results.extend(QuarantineResult.failure(ip, sensor_id, e) for ip in ips)
+                continue
+            
+            for ip in ips:
+                try:
+                    results.append(operation(ip, sensor_id, quarantine_area))
+                except NSMError as e:
+                    results.append(QuarantineResult.failure(ip, sensor_id, e))
+                    
+        return BatchResult(results)
+
+class SyslogUDPHandler(socketserver.BaseRequestHandler):
+    '''
+    
+    Description: One syslog message per UDP datagram
+    
+    Use        : To be used internally in the module
+    '''
+    def handle(self):
+        self.server.ingestor.submit(self.request[0].decode('utf-8', 'replace'))
+
+class SyslogTCPHandler(socketserver.StreamRequestHandler):
+    '''
+    
+    Description: Newline delimited syslog messages over a TCP connection
+    
+    Use        : To be used internally in the module
+    '''
+    def handle(self):
+        limit = self.server.ingestor.max_body
+        while True:
+            line = self.rfile.readline(limit + 1)
+            if not line:
+                break
+            if len(line) > limit and not line.endswith(b'\n'):
+                # No newline within the limit, the client is not sending syslog lines
+                break
+            self.server.ingestor.submit(line.decode('utf-8', 'replace'))
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    '''
+    
+    Description: Webhook events, the body of every POST request is scanned for IP addresses
+    
+    Use        : To be used internally in the module
+    '''
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            length = -1
+            
+        if length < 0:
+            return self.reply(400)
+        if length > self.server.ingestor.max_body:
+            return self.reply(413)
+        
+        if self.server.ingestor.submit(self.rfile.read(length).decode('utf-8', 'replace')):
+            self.reply(202)
         else:
-            response=(0,"IP %s not in quarantined" % ip_address)
+            # The queue is full, the sender should retry later
+            self.reply(503)
             
-        return response
+    def reply(self, code):
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        if code != 202:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        
+    def log_message(self, format, *args):
+        pass
+
+class SyslogUDPServer(socketserver.UDPServer):
+    allow_reuse_address = True
+    
+    # Bigger receive buffer to absorb bursts of syslog messages, the kernel caps it to net.core.rmem_max
+    receive_buffer = 8 * 1024 * 1024
+    
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        socketserver.UDPServer.server_bind(self)
+
+class SyslogTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class Ingestor:
+    '''
+    
+    Description: Quarantine the IP addresses found in syslog and webhook events. Listeners only
+                 extract the IP addresses, a single worker deduplicates them and sends them in
+                 micro-batches to quarantine_many over the session of the nsm object.
+    
+    Use        : To be used as a public interface
+    '''
+    
+    # Failures a retry can not fix, the IP address is considered done on those sensors
+    settled = frozenset([ERR_ALREADY_QUARANTINED, ERR_UNKNOWN_SENSOR, ERR_UNSUPPORTED_SENSOR])
+    
+    # Largest webhook body or syslog TCP line accepted, in bytes
+    max_body = 1024 * 1024
+    
+    def __init__(self, myNSM, sensors, patterns, duration=15, dedup_window=60, batch_size=100, batch_wait=1.0,
+                 on_batch=None, max_queue=100000):
+        '''
+        
+        Description: Constructor
+        
+        Input      : 
+                     nsm object, already connected and with the list of sensors loaded
+                     List of sensor identifications to quarantine the IP addresses on
+                     patterns, list of regular expressions matching the IP addresses to quarantine.
+                     If the expression has groups the first one is used
+                     Duration of the quarantine operation. See nsm.post_qhost
+                     dedup_window, seconds during which a quarantined IP address is not sent again
+                     batch_size, maximum number of IP addresses per batch
+                     batch_wait, maximum seconds an IP address waits for its batch to fill up
+                     on_batch, optional function called with every BatchResult
+                     max_queue, maximum number of IP addresses waiting for the worker. Further
+                     IP addresses are dropped and counted in the dropped attribute
+        
+        Output     : No Output
+        
+        Use        : To be used as a public interface
+        '''
+        if not patterns:
+            raise ValueError('At least one pattern is required')
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        if batch_wait < 0 or dedup_window < 0:
+            raise ValueError('batch_wait and dedup_window can not be negative')
+        
+        self.nsm = myNSM
+        self.sensors = list(sensors)
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.duration = duration
+        self.dedup_window = dedup_window
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.on_batch = on_batch
+        
+        self.events = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.seen = {}
+        self.pending = set()
+        self.purge_at = 1024
+        self.servers = []
+        self.stopped = threading.Event()
+        
+    def extract(self, text):
+        '''
+        
+        Description: Find the IP addresses in an event
+        
+        Input      : Event text
+        
+        Output     : List of IP address strings
+        
+        Use        : To be used as a public interface
+        '''
+        ips = []
+        for pattern in self.patterns:
+            for match in pattern.finditer(text):
+                candidate = match.group(1) if pattern.groups else match.group(0)
+                try:
+                    # Patterns like src=(\S+) also take the punctuation around the address, ie: 1.2.3.4,
+                    ips.append(str(ipaddress.ip_address(candidate.strip('.,;!?\'"()[]{}<>'))))
+                except ValueError:
+                    # The pattern matched something that is not an IP address, ie: 300.1.1.1
+                    pass
+        return ips
+    
+    def submit(self, text):
+        '''
+        
+        Description: Queue the IP addresses of an event. Safe to call from any thread.
+        
+        Input      : Event text
+        
+        Output     : Boolean, False if some IP address was dropped because the queue is full
+        
+        Use        : To be used as a public interface
+        '''
+        queued = True
+        for ip in self.extract(text):
+            try:
+                self.events.put_nowait(ip)
+            except queue.Full:
+                # Listeners run in several threads
+                with self.dropped_lock:
+                    self.dropped += 1
+                queued = False
+        return queued
+            
+    def is_new(self, ip, now):
+        '''
+        
+        Description: Deduplicate the IP addresses waiting in the batch or quarantined within
+                     the dedup window
+        
+        Input      : IP address and current monotonic time
+        
+        Output     : Boolean, True if the IP address has to be sent
+        
+        Use        : To be used internally in the class
+        '''
+        if ip in self.pending:
+            return False
+        last = self.seen.get(ip)
+        return last is None or now - last >= self.dedup_window
+    
+    def remember(self, ip, now):
+        '''
+        
+        Description: Start the dedup window of a quarantined IP address
+        
+        Input      : IP address and current monotonic time
+        
+        Output     : No Output
+        
+        Use        : To be used internally in the class
+        '''
+        self.seen[ip] = now
+        
+        # Forget the expired addresses once the table doubles its size
+        if len(self.seen) >= self.purge_at:
+            self.seen = dict((each_ip, seen) for each_ip, seen in self.seen.items() if now - seen < self.dedup_window)
+            self.purge_at = max(1024, 2 * len(self.seen))
+    
+    def listen(self, server_class, handler, address, port):
+        '''
+        
+        Description: Start a listener in a background thread
+        
+        Input      : socketserver server class, request handler class, address and port to bind
+        
+        Output     : Server object
+        
+        Use        : To be used internally in the class
+        '''
+        server = server_class((address, port), handler)
+        server.ingestor = self
+        self.servers.append(server)
+        threading.Thread(target=server.serve_forever, name='nsmcli-%s' % handler.__name__, daemon=True).start()
+        return server
+    
+    def listen_syslog_udp(self, port, address='127.0.0.1'):
+        '''
+        
+        Description: Listen for syslog messages on a UDP port
+        
+        Input      : Port and address to bind, 127.0.0.1 by default
+        
+        Output     : Server object
+        
+        Use        : To be used as a public interface
+        '''
+        return self.listen(SyslogUDPServer, SyslogUDPHandler, address, port)
+    
+    def listen_syslog_tcp(self, port, address='127.0.0.1'):
+        '''
+        
+        Description: Listen for newline delimited syslog messages on a TCP port
+        
+        Input      : Port and address to bind, 127.0.0.1 by default
+        
+        Output     : Server object
+        
+        Use        : To be used as a public interface
+        '''
+        return self.listen(SyslogTCPServer, SyslogTCPHandler, address, port)
+    
+    def listen_webhook(self, port, address='127.0.0.1'):
+        '''
+        
+        Description: Listen for webhook events on a HTTP port
+        
+        Input      : Port and address to bind, 127.0.0.1 by default
+        
+        Output     : Server object
+        
+        Use        : To be used as a public interface
+        '''
+        return self.listen(ThreadingHTTPServer, WebhookHandler, address, port)
+    
+    def flush(self, batch):
+        '''
+        
+        Description: Quarantine a batch of IP addresses on all the sensors. If the NSM session
+                     has expired the connection is opened again and the batch retried once.
+                     Only the IP addresses quarantined on every sensor start their dedup window,
+                     the others are sent again the next time they are received.
+        
+        Input      : List of IP addresses
+        
+        Output     : BatchResult
+        
+        Use        : To be used internally in the class
+        '''
+        result = self.nsm.quarantine_many(batch, self.sensors, self.duration)
+        
+        if any(each_result.status_code == 401 for each_result in result.failed):
+            try:
+                self.nsm.reconnect()
+            except NSMError:
+                pass
+            else:
+                result = self.nsm.quarantine_many(batch, self.sensors, self.duration)
+        
+        failed = set(each_result.ip_address for each_result in result.failed if each_result.code not in self.settled)
+        now = time.monotonic()
+        for ip in batch:
+            self.pending.discard(ip)
+            if ip not in failed:
+                self.remember(ip, now)
+        
+        if self.on_batch:
+            self.on_batch(result)
+        return result
+    
+    def run(self):
+        '''
+        
+        Description: Process the queued IP addresses until stop() is called or the thread is
+                     interrupted. Pending IP addresses are sent and the listeners closed on exit.
+        
+        Input      : No input
+        
+        Output     : No Output
+        
+        Use        : To be used as a public interface
+        '''
+        batch = []
+        deadline = None
+        try:
+            while not self.stopped.is_set():
+                timeout = self.batch_wait if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    ip = self.events.get(timeout=timeout)
+                except queue.Empty:
+                    ip = None
+                    
+                # None is queued by stop() to wake up the worker
+                now = time.monotonic()
+                if ip is not None and self.is_new(ip, now):
+                    batch.append(ip)
+                    self.pending.add(ip)
+                    if deadline is None:
+                        deadline = now + self.batch_wait
+                        
+                if batch and (len(batch) >= self.batch_size or now >= deadline):
+                    self.flush(batch)
+                    batch = []
+                    deadline = None
+        finally:
+            for server in self.servers:
+                server.shutdown()
+                server.server_close()
+            self.servers = []
+            
+            # Send whatever was received before the listeners were closed
+            while True:
+                try:
+                    ip = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                if ip is not None and self.is_new(ip, time.monotonic()):
+                    batch.append(ip)
+                    self.pending.add(ip)
+            for start in range(0, len(batch), self.batch_size):
+                self.flush(batch[start:start + self.batch_size])
+                
+    def stop(self):
+        '''
+        
+        Description: Ask run() to return
+        
+        Input      : No input
+        
+        Output     : No Output
+        
+        Use        : To be used as a public interface
+        '''
+        self.stopped.set()
+        try:
+            self.events.put_nowait(None)
+        except queue.Full:
+            # The worker is busy and will see the stop request with the next IP address
+            pass
+
+class Profiler:
+    '''
+    
+    Description: Timers for the phases of a CLI run and the methods of a nsm object.
+                 Optionally collects cProfile and tracemalloc data.
+    
+    Use        : To be used as a public interface
+    '''
+    
+    def __init__(self, enabled=False, cprofile=False, memory=False):
+        '''
+        
+        Description: Constructor
+        
+        Input      : 
+                     enabled, time phases and nsm methods. When False every operation is a no-op
+                     cprofile, run the cProfile deterministic profiler
+                     memory, trace memory allocations with tracemalloc
+        
+        Output     : No Output
+        
+        Use        : To be used as a public interface
+        '''
+        self.enabled = enabled or cprofile or memory
+        self.phases = {}
+        self.methods = {}
+        self.folded = {}
+        self.stack = []
+        self.cprofile = None
+        self.memory = memory
+        self.started = time.perf_counter()
+        
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+            
+    def start(self, name):
+        '''
+        
+        Description: Open a timer nested in the current one
+        
+        Input      : Timer name
+        
+        Output     : No Output
+        
+        Use        : To be used internally in the class
+        '''
+        self.stack.append([name, time.perf_counter(), 0.0])
+        
+    def stop(self, table):
+        '''
+        
+        Description: Close the innermost timer and account its time
+        
+        Input      : Table (phases or methods) where the inclusive time is added
+        
+        Output     : Elapsed seconds
+        
+        Use        : To be used internally in the class
+        '''
+        name, started, children = self.stack.pop()
+        elapsed = time.perf_counter() - started
+        
+        entry = table.setdefault(name, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += elapsed
+        
+        # Folded stacks keep the exclusive time of each call path
+        path = ';'.join([frame[0] for frame in self.stack] + [name])
+        self.folded[path] = self.folded.get(path, 0.0) + elapsed - children
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        return elapsed
+    
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''
+        
+        Description: Time a phase of the CLI run. Phases are not expected to be nested.
+        
+        Input      : Phase name
+        
+        Use        : To be used as a public interface
+        '''
+        if not self.enabled:
+            yield
+            return
+        
+        if self.memory:
+            import tracemalloc
+            # Tracing starts with the first phase, once the nsm methods have been wrapped
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(self.phases)
+            if self.memory:
+                entry = self.phases[name]
+                entry[2] = max(entry[2], tracemalloc.get_traced_memory()[1] - baseline)
+                
+    def wrap(self, myNSM):
+        '''
+        
+        Description: Replace the public methods of a nsm object by timed versions. Calls
+                     made inside the class go through the instance and are timed too.
+        
+        Input      : nsm object
+        
+        Output     : The same nsm object
+        
+        Use        : To be used as a public interface
+        '''
+        if not self.enabled:
+            return myNSM
+        
+        for name in vars(type(myNSM)):
+            if not name.startswith('_') and callable(getattr(myNSM, name)):
+                setattr(myNSM, name, self.timed('nsm.' + name, getattr(myNSM, name)))
+        return myNSM
+    
+    def timed(self, name, function):
+        '''
+        
+        Description: Build a timed version of a function
+        
+        Input      : Timer name and function
+        
+        Output     : Function wrapper
+        
+        Use        : To be used internally in the class
+        '''
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self.start(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.stop(self.methods)
+        return wrapper
+    
+    def report(self, stream=None, output=None):
+        '''
+        
+        Description: Print the per-phase and per-method breakdown and write the profile files
+        
+        Input      : 
+                     stream, where the report is printed. sys.stderr by default
+                     output, optional path prefix. <output>.folded receives the folded stacks
+                     (flamegraph.pl, speedscope) and <output>.pstats the cProfile data
+        
+        Output     : No Output
+        
+        Use        : To be used as a public interface
+        '''
+        if not self.enabled:
+            return
+        
+        stream = stream or sys.stderr
+        wall = time.perf_counter() - self.started
+        
+        if self.cprofile:
+            self.cprofile.disable()
+        
+        print('\nProfile - wall time %.1f ms' % (wall * 1000), file=stream)
+        print('\n{:<32}{:>8}{:>12}{:>8}{:>12}'.format('Phase', 'Calls', 'Total ms', '%', 'Peak KiB'), file=stream)
+        print('*'*72, file=stream)
+        for name in self.phases:
+            calls, total, peak = self.phases[name]
+            print('{:<32}{:>8}{:>12.1f}{:>8.1f}{:>12}'.format(name, calls, total * 1000, 100 * total / wall,
+                                                           '%.1f' % (peak / 1024.0) if self.memory else '-'), file=stream)
+        
+        print('\n{:<32}{:>8}{:>12}{:>12}'.format('Method', 'Calls', 'Total ms', 'Mean ms'), file=stream)
+        print('*'*64, file=stream)
+        for name in sorted(self.methods, key=lambda name: -self.methods[name][1]):
+            calls, total = self.methods[name][:2]
+            print('{:<32}{:>8}{:>12.1f}{:>12.2f}'.format(name, calls, total * 1000, total * 1000 / calls), file=stream)
+        
+        import tracemalloc
+        if self.memory and tracemalloc.is_tracing():
+            import inspect
+            
+            # Leave out the allocations of the profiler itself
+            lines, first = inspect.getsourcelines(Profiler)
+            own = range(first, first + len(lines))
+            statistics = [stat for stat in tracemalloc.take_snapshot().statistics('lineno')
+                          if not (stat.traceback[0].filename == __file__ and stat.traceback[0].lineno in own)]
+            
+            print('\nTop memory allocations', file=stream)
+            print('*'*64, file=stream)
+            for stat in statistics[:10]:
+                print(stat, file=stream)
+            tracemalloc.stop()
+        
+        if self.cprofile and not output:
+            import pstats
+            print('\ncProfile - top functions by cumulative time', file=stream)
+            pstats.Stats(self.cprofile, stream=stream).sort_stats('cumulative').print_stats(15)
+        
+        if output:
+            # Folded stacks in microseconds, one "frame;frame;frame value" line per call path
+            with open(output + '.folded', 'w') as f:
+                for path in self.folded:
+                    f.write('%s %d\n' % (path, round(self.folded[path] * 1000000)))
+            print('\nFolded stacks written to %s.folded' % output, file=stream)
+            if self.cprofile:
+                self.cprofile.dump_stats(output + '.pstats')
+                print('cProfile data written to %s.pstats' % output, file=stream)
 
 def parseargs():
     
@@ -399,7 +1257,10 @@ def parseargs():
     usage       = '''nsmcli.py [-h] -u USER -p PASSWORD -nsm NSM_IP
        [-get_sensors][-get_qhosts][-sensor SENSOR_NAME]
        [-i IP_ADDRESS][-quarantine][-remove]
-       [-t {15,30,45,60,240,480,720,960,999}][--version]'''
+       [-t {15,30,45,60,240,480,720,960,999}]
+       [-ingest][-syslog_udp PORT][-syslog_tcp PORT][-webhook PORT][-listen ADDRESS]
+       [-pattern REGEX][-dedup SECONDS][-batch_size N][-batch_wait SECONDS]
+       [--profile][--cprofile][--tracemalloc][--profile_out PREFIX][--version]'''
     epilog      = '''Examples:
     1)
     nsmcli.py -u admin -p admin123 -nsm 192.168.0.202 -get_sensors
@@ -464,6 +1325,11 @@ def parseargs():
     10.10.10.101  1375818608000      
     10.10.10.102  1375818798000      
     10.10.10.103  1375818860000      
+    
+    7)
+    nsmcli.py -u admin -p admin123 -nsm 192.168.0.202 -ingest -syslog_udp 5514 -webhook 8080 -pattern "src=(\S+)" -t 60
+    
+    Sensor  M2750-4pocs IP 10.10.10.104 quarantine for SIXTY_MINUTES 
     '''      
 
 
@@ -517,231 +1383,282 @@ def parseargs():
     arg_help = arg_help + 'Affected by the optional parameter [-sensor]'
     parser.add_argument('-remove', action='store_true', default=False, dest='remove', help=arg_help)
     
+    # Ingestion options, the quarantine duration and sensor are taken from [-t] and [-sensor]
+    ingest_group = parser.add_argument_group('Ingestion parameters')
+    
+    arg_help = 'Quarantine the IP addresses received on the syslog and webhook listeners\n'
+    arg_help = arg_help + 'until interrupted with Ctrl-C. Affected by [-sensor] and [-t]'
+    ingest_group.add_argument('-ingest', action='store_true', default=False, dest='ingest', help=arg_help)
+    
+    arg_help = 'UDP port to receive syslog messages on'
+    ingest_group.add_argument('-syslog_udp', type=int, action='store', dest='syslog_udp', help=arg_help, metavar='PORT')
+    
+    arg_help = 'TCP port to receive newline delimited syslog messages on'
+    ingest_group.add_argument('-syslog_tcp', type=int, action='store', dest='syslog_tcp', help=arg_help, metavar='PORT')
+    
+    arg_help = 'HTTP port to receive webhook events on (POST)'
+    ingest_group.add_argument('-webhook', type=int, action='store', dest='webhook', help=arg_help, metavar='PORT')
+    
+    arg_help = 'Address the listeners bind to. 127.0.0.1 by default'
+    ingest_group.add_argument('-listen', action='store', default='127.0.0.1', dest='listen', help=arg_help, metavar='ADDRESS')
+    
+    arg_help = 'Regular expression matching the IP addresses to quarantine in the events.\n'
+    arg_help = arg_help + 'The first group is used if it has groups. Can be repeated.\n'
+    arg_help = arg_help + 'Required with [-ingest], ie: "src=(\\S+)"'
+    ingest_group.add_argument('-pattern', action='append', dest='patterns', help=arg_help, metavar='REGEX')
+    
+    arg_help = 'Seconds during which an IP address is only quarantined once. 60 by default'
+    ingest_group.add_argument('-dedup', type=float, default=60, action='store', dest='dedup', help=arg_help, metavar='SECONDS')
+    
+    arg_help = 'Maximum number of IP addresses sent per batch. 100 by default'
+    ingest_group.add_argument('-batch_size', type=int, default=100, action='store', dest='batch_size', help=arg_help, metavar='N')
+    
+    arg_help = 'Maximum seconds an IP address waits for its batch. 1 by default'
+    ingest_group.add_argument('-batch_wait', type=float, default=1.0, action='store', dest='batch_wait', help=arg_help, metavar='SECONDS')
+    
+    # Profiling options, the report is printed to standard error
+    profile_group = parser.add_argument_group('Profiling parameters')
+    
+    arg_help = 'Time each phase of the run and each Network Security Manager API method.\n'
+    arg_help = arg_help + 'The report is printed to standard error'
+    profile_group.add_argument('--profile', action='store_true', default=False, dest='profile', help=arg_help)
+    
+    arg_help = 'Also collect cProfile data. Implies [--profile]'
+    profile_group.add_argument('--cprofile', action='store_true', default=False, dest='cprofile', help=arg_help)
+    
+    arg_help = 'Also trace memory allocations per phase with tracemalloc. Implies [--profile]'
+    profile_group.add_argument('--tracemalloc', action='store_true', default=False, dest='tracemalloc', help=arg_help)
+    
+    arg_help = 'Write PREFIX.folded (flamegraph folded stacks, microseconds)\n'
+    arg_help = arg_help + 'and PREFIX.pstats (with [--cprofile]). Implies [--profile]'
+    profile_group.add_argument('--profile_out', action='store', dest='profile_out', help=arg_help, metavar='PREFIX')
+    
     parser.add_argument('--version',action='version',version='Carlos Munoz (carlos_munoz@mcafee.com)\n%(prog)s 1.0 (08/06/2013)')
     
-    return parser.parse_args()
+    options = parser.parse_args()
+    
+    # Quarantining every IP address of an event, ie: the syslog host, is never what is wanted
+    if options.ingest and not options.patterns:
+        parser.error('-ingest requires at least one -pattern')
+    if options.batch_size < 1:
+        parser.error('-batch_size must be at least 1')
+    if options.batch_wait < 0:
+        parser.error('-batch_wait can not be negative')
+    if options.dedup < 0:
+        parser.error('-dedup can not be negative')
+    for pattern in options.patterns or []:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            parser.error('invalid -pattern %s: %s' % (pattern, e))
+    
+    return options
 
 def get_sensorlist(myNSM):
-    error_control, data = myNSM.get_sensors()
     
-    if error_control == 0:
-        print 'Error - getting sensor list: ', data
-        #print 'Information returned: \n', data
-        #sys.exit(0)
+    sensor_list = {}
+    try:
+        sensors = myNSM.get_sensors()
+    except NSMError as e:
+        print('Error - getting sensor list: ', e)
     else:
-        sensor_list = {}
-        for descriptor in data:
-            for sensor in data[descriptor]:
-                
-                name                = '*'*8
-                model               = '*'*8
-                sensorIPAddress     = '*'*8
-                sensorId            = '*'*8
-                softwareVersion     = '*'*8
-                sigsetVersion       = '*'*8
-            
-                if 'name'            in sensor:    name              = sensor['name']
-                if 'model'           in sensor:    model             = sensor['model']
-                if 'sensorIPAddress' in sensor:    sensorIPAddress   = sensor['sensorIPAddress']
-                if 'sensorId'        in sensor:    sensorId          = sensor['sensorId']
-                if 'SoftwareVersion' in sensor:    softwareVersion   = sensor['SoftwareVersion']
-                if 'SigsetVersion'   in sensor:    sigsetVersion     = sensor['SigsetVersion']
-                
-                sensor_list[name]=[sensorId, model, sensorIPAddress, softwareVersion, sigsetVersion, myNSM.is_sensorup(sensorId)]
+        for sensor in sensors:
+            sensor_list[sensor.name or '*'*8] = sensor
                 
     return sensor_list
 
-def get_qhosts(myNSM, sensor_name):
+def select_sensors(myNSM, sensor_name, operation):
     
-    response = {}
-    # First check if sensor_name has a value   
+    sensors = get_sensorlist(myNSM)
+    # First check if sensor_name has a value, otherwise the action applies to all sensors
     if sensor_name:
-        sensors = get_sensorlist(myNSM)
         if sensor_name in sensors:
-            sensor_Id = sensors[sensor_name][0]
-            error_control, data = myNSM.get_qhosts(sensor_Id)
-            
-            if error_control == 0:
-                print 'Error - getting quarantine hosts: ', data
-                #print 'Information returned: \n', data
-                #myNSM.disconnect()
-                #sys.exit(0)
-            else:
-                response[sensor_name] = data                
+            return {sensor_name: sensors[sensor_name]}
+        # sensor name doesn't exit
+        print('Error - %s: Sensor %s not managed by Network Security Manager' % (operation, sensor_name))
+        return {}
+    return sensors
+
+def batch_response(sensors, batch, operation):
+    
+    response = {}
+    sensor_names = dict((sensors[sensor_name].sensor_id, sensor_name) for sensor_name in sensors)
+    for result in batch:
+        if result.ok:
+            response[sensor_names[result.sensor_id]] = result.message
         else:
-            # sensor name doesn't exit
-            print 'Error - getting quarantine hosts: Sensor %s not managed by Network Security Manager' % sensor_name
-            #myNSM.disconnect()
-            #sys.exit(0)
-                
-    else:
-        # All quarantine host from all sensor must be obtained
-        sensor_list = get_sensorlist(myNSM)
-        for sensor_name in sensor_list:
-            sensor_Id = sensor_list[sensor_name][0]
-            error_control, data = myNSM.get_qhosts(sensor_Id)
-            if error_control == 0:
-                print 'Error - getting quarantine hosts: ', data                
-            else:
-                response[sensor_name] = data
+            print('Error - %s: ' % operation, result.message)
+            
+    return response
+
+def get_qhosts(myNSM, sensor_name):
+    
+    response = {}
+    sensors = select_sensors(myNSM, sensor_name, 'getting quarantine hosts')
+    for sensor_name in sensors:
+        try:
+            response[sensor_name] = myNSM.get_qhosts(sensors[sensor_name].sensor_id)
+        except NSMError as e:
+            print('Error - getting quarantine hosts: ', e)
                 
     return response       
 
 def quarantine_ip(myNSM, sensor_name, ip, time):
     
-    response = {}
-
-    # First check if sensor_name has a value   
-    if sensor_name:
-        sensors = get_sensorlist(myNSM)
-        if sensor_name in sensors:
-            sensor_Id = sensors[sensor_name][0]
-            error_control, data = myNSM.post_qhost(ip, sensor_Id, time)
-            
-            if error_control == 0:
-                print 'Error - quarantine: ', data
-                #print 'Information returned: ', data
-                #print 'Disconnecting from Network Security Manager'
-                #myNSM.disconnect()
-                #sys.exit(0)
-            else:
-                response[sensor_name] = data                
-        else:
-            # sensor name doesn't exit
-            print 'Error - quarantine: Sensor %s not managed by Network Security Manager' % sensor_name
-            #print 'Disconnecting from Network Security Manager'
-            #myNSM.disconnect()
-            #sys.exit(0)
-                
-    else:
-        # sensor name not indicated send the ip address to the quarantine of all sensors
-        sensor_list = get_sensorlist(myNSM)
-        for sensor_name in sensor_list:
-            sensor_Id = sensor_list[sensor_name][0]
-            error_control, data = myNSM.post_qhost(ip, sensor_Id, time)
-            if error_control == 0:
-                print 'Error - quarantine: ', data
-         
-            else:
-                response[sensor_name] = data
-                
-    return response              
+    sensors = select_sensors(myNSM, sensor_name, 'quarantine')
+    batch = myNSM.quarantine_many([ip], [sensors[name].sensor_id for name in sensors], time)
+    return batch_response(sensors, batch, 'quarantine')
 
 def remove_ip(myNSM, sensor_name, ip):
-    response = {}
-  
-    # First check if sensor_name has a value   
-    if sensor_name:
-        sensors = get_sensorlist(myNSM)
-        if sensor_name in sensors:
-            sensor_Id = sensors[sensor_name][0]
-            error_control, data = myNSM.delete_qhost(ip, sensor_Id)
-            
-            if error_control == 0:
-                print 'Error - remove: ', data
-                #print 'Disconnecting from Network Security Manager'
-                #myNSM.disconnect()
-                #sys.exit(0)
-            else:
-                response[sensor_name] = data                
-        else:
-            # sensor name doesn't exit
-            print 'Error - remove: Sensor %s not managed by Network Security Manager' % sensor_name
-            #print 'Disconnecting from Network Security Manager'
-            #myNSM.disconnect()
-            #sys.exit(0)
-                
-    else:
-        # sensor name not indicated send the ip address to the quarantine of all sensors
-        sensor_list = get_sensorlist(myNSM)
-        for sensor_name in sensor_list:
-            sensor_Id = sensor_list[sensor_name][0]
-            error_control, data = myNSM.delete_qhost(ip, sensor_Id)
-            if error_control == 0:
-                print 'Error - remove : ', data
-         
-            else:
-                response[sensor_name] = data
-                
-    return response
+    
+    sensors = select_sensors(myNSM, sensor_name, 'remove')
+    batch = myNSM.release_many([ip], [sensors[name].sensor_id for name in sensors])
+    return batch_response(sensors, batch, 'remove')
+
+def ingest(myNSM, options):
+    
+    sensors = select_sensors(myNSM, options.sensor_name, 'ingest')
+    if not sensors:
+        return
+    sensor_names = dict((sensors[sensor_name].sensor_id, sensor_name) for sensor_name in sensors)
+    
+    def print_batch(batch):
+        # A sensor failure is reported for every IP address of the batch, print it only once
+        errors = set()
+        for result in batch:
+            if result.ok:
+                print('Sensor ', sensor_names[result.sensor_id], result.message, flush=True)
+            elif result.code != ERR_ALREADY_QUARANTINED and result.message not in errors:
+                errors.add(result.message)
+                print('Error - ingest: ', result.message, flush=True)
+    
+    ingestor = Ingestor(myNSM, sensor_names, options.patterns, options.duration, options.dedup,
+                        options.batch_size, options.batch_wait, print_batch)
+    try:
+        if options.syslog_udp: ingestor.listen_syslog_udp(options.syslog_udp, options.listen)
+        if options.syslog_tcp: ingestor.listen_syslog_tcp(options.syslog_tcp, options.listen)
+        if options.webhook:    ingestor.listen_webhook(options.webhook, options.listen)
+    except OSError as e:
+        print('Error - ingest: ', e)
+        ingestor.stop()
+        
+    try:
+        ingestor.run()
+    except KeyboardInterrupt:
+        # Ctrl-C is the normal way to end the ingestion
+        pass
+    
+    if ingestor.dropped:
+        print('Error - ingest: %d IP addresses dropped, the queue was full' % ingestor.dropped)
 
 def main(): 
     # Get the list of parameters passed from command line
     options = parseargs()
     
-    # Create the NSM object and connect to it
-    myNSM = nsm(options.nsm_ip)
-    error_control, data = myNSM.connect(options.user, options.password)
+    # The profiler is a no-op unless one of the profiling switches has been set
+    profiler = Profiler(options.profile or bool(options.profile_out), options.cprofile, options.tracemalloc)
+    
+    # Create the NSM object, its methods are timed when profiling
+    myNSM = profiler.wrap(nsm(options.nsm_ip))
     
-    if error_control == 0:
-        print 'Error - connect: ', data
-        sys.exit(0)
+    try:
+        run(options, myNSM, profiler)
+    finally:
+        profiler.report(output=options.profile_out)
+
+def run(options, myNSM, profiler):
+    # Connect to the NSM
+    with profiler.phase('connect'):
+        try:
+            myNSM.connect(options.user, options.password)
+        except NSMError as e:
+            print('Error - connect: ', e)
+            sys.exit(0)
     # ***************************************
     
     # if the switch quarantine has been set the IP address passed to the system must be put in quarantine
     if options.quarantine:
         if options.q_ip:
-            result = quarantine_ip(myNSM, options.sensor_name, options.q_ip, options.duration)
-            for sensor in result:
-                print '\nSensor ', sensor, result[sensor]
+            with profiler.phase('quarantine'):
+                result = quarantine_ip(myNSM, options.sensor_name, options.q_ip, options.duration)
+            with profiler.phase('output'):
+                for sensor in result:
+                    print('\nSensor ', sensor, result[sensor])
         else:
-            print 'Error - quarantine: set the IP address to be sent to quarantine with the switch -i'
+            print('Error - quarantine: set the IP address to be sent to quarantine with the switch -i')
 
     # **************************************************
     
     # if the switch remove has been set, the IP address passed to the system must be removed from quarantine
     if options.remove:
         if options.q_ip:
-            result = remove_ip(myNSM, options.sensor_name, options.q_ip)
-            for sensor in result:
-                print '\nSensor ', sensor, result[sensor]
+            with profiler.phase('remove'):
+                result = remove_ip(myNSM, options.sensor_name, options.q_ip)
+            with profiler.phase('output'):
+                for sensor in result:
+                    print('\nSensor ', sensor, result[sensor])
         else:
-            print 'Error - remove: set the IP address to be removed from quarantine with switch -i'
+            print('Error - remove: set the IP address to be removed from quarantine with switch -i')
     # *************************************************
     
     # if the switch get-sensors has been set get the list    
     if options.get_sensors:
-        sensor_list = get_sensorlist(myNSM)
-        # Printing the header for the list of sensors
-        print '\n{:<14}{:<10}{:<10}{:<16}{:<12}{:<12}{:<6}'.format('Name', 'ID', 'Model', 'Sensor IP', 'SW Ver', 'Sigset Ver', 'Active')
-        print '*'*80
-        for sensor_name in sensor_list:
-            
-            sensorId        = sensor_list[sensor_name][0]
-            model           = sensor_list[sensor_name][1]
-            sensorIPAddress = sensor_list[sensor_name][2]
-            softwareVersion = sensor_list[sensor_name][3]
-            sigsetVersion   = sensor_list[sensor_name][4]
-            active          = sensor_list[sensor_name][5]
-            
-            print '{:<14}{:<10}{:<10}{:<16}{:<12}{:<12}{:<6}'.format(sensor_name, sensorId, model, sensorIPAddress, softwareVersion, sigsetVersion, active)
+        with profiler.phase('get_sensors'):
+            sensor_list = get_sensorlist(myNSM)
+        with profiler.phase('status checks'):
+            active = dict((sensor_name, myNSM.is_sensorup(sensor_list[sensor_name].sensor_id)) for sensor_name in sensor_list)
+        with profiler.phase('output'):
+            # Printing the header for the list of sensors
+            print('\n{:<14}{:<10}{:<10}{:<16}{:<12}{:<12}{:<6}'.format('Name', 'ID', 'Model', 'Sensor IP', 'SW Ver', 'Sigset Ver', 'Active'))
+            print('*'*80)
+            for sensor_name in sensor_list:
+                
+                sensor          = sensor_list[sensor_name]
+                model           = sensor.model or '*'*8
+                sensorIPAddress = sensor.ip_address or '*'*8
+                softwareVersion = sensor.software_version or '*'*8
+                sigsetVersion   = sensor.sigset_version or '*'*8
+                
+                print('{:<14}{:<10}{:<10}{:<16}{:<12}{:<12}{:<6}'.format(sensor_name, sensor.sensor_id, model, sensorIPAddress, softwareVersion, sigsetVersion, active[sensor_name]))
             
     # **************************************************
     
     
     # if the switch get_qhosts has been set get the list
     if options.get_qhosts:
-        q_hosts = get_qhosts(myNSM, options.sensor_name)
-
-        if q_hosts:
-            # the dictionary contents data
-            for sensor in q_hosts:
-                print '\nQuarantined hosts for %s\n'% sensor
-                print '{:<16}{:<19}'.format('IP Address','Time (Milliseconds)')
-                print '*'*33
-                for n in range(len(q_hosts[sensor])):
-                    print '{:<16}{:<19}'.format(q_hosts[sensor][n][0],q_hosts[sensor][n][1])
-        #else:
-            # the dictionary is empty
-        #   print 'Non quarantine hosts'
+        with profiler.phase('get_qhosts'):
+            q_hosts = get_qhosts(myNSM, options.sensor_name)
+
+        with profiler.phase('output'):
+            if q_hosts:
+                # the dictionary contents data
+                for sensor in q_hosts:
+                    print('\nQuarantined hosts for %s\n'% sensor)
+                    print('{:<16}{:<19}'.format('IP Address','Time (Milliseconds)'))
+                    print('*'*33)
+                    for entry in q_hosts[sensor]:
+                        print('{:<16}{:<19}'.format(entry.ip_address, entry.duration))
+            #else:
+                # the dictionary is empty
+            #   print 'Non quarantine hosts'
     # **************************************************
-  
     
-    error_control, data =  myNSM.disconnect()
+    # if the switch ingest has been set quarantine the IP addresses received until interrupted
+    if options.ingest:
+        if options.syslog_udp or options.syslog_tcp or options.webhook:
+            with profiler.phase('ingest'):
+                ingest(myNSM, options)
+        else:
+            print('Error - ingest: set at least one listener with -syslog_udp, -syslog_tcp or -webhook')
+    # **************************************************
+  
     
-    if error_control == 0:
-        print 'Error - disconnect: ', data
-        sys.exit(0)
+    with profiler.phase('disconnect'):
+        try:
+            myNSM.disconnect()
+        except NSMError as e:
+            print('Error - disconnect: ', e)
+            sys.exit(0)
 
 if __name__ == '__main__':
     main()
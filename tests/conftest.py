@@ -0,0 +1,285 @@
+import base64
+import json
+import os
+import re
+import shutil
+import ssl
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nsmcli
+
+
+SENSORS = [
+    {'sensorId': 1001, 'name': 'M2750-4pocs', 'model': 'M-2750', 'sensorIPAddress': '192.168.0.203',
+     'SoftwareVersion': '7.5.3.16', 'SigsetVersion': '7.6.14.9'},
+    {'sensorId': 1002, 'name': 'old-sensor', 'model': 'I-1200'},
+]
+
+
+def b64(user, password):
+    return base64.b64encode(('%s:%s' % (user, password)).encode('utf-8')).decode('ascii')
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.text = body if isinstance(body, str) else json.dumps(body)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError('%s Error' % self.status_code, response=self)
+
+
+class MockNSM:
+    '''
+    Network Security Manager answering the NSM-SDK-API calls used by nsmcli and counting
+    the requests per HTTP method. It stands in for requests.Session, or is served over
+    HTTPS on 127.0.0.1 for the tests marked http (see serve_https).
+    '''
+
+    user = 'admin'
+    password = 'admin123'
+
+    def __init__(self):
+        self.sensors = [dict(sensor) for sensor in SENSORS]
+        self.status = {1001: 'ACTIVE', 1002: 'ACTIVE'}
+        self.qhosts = {1001: [{'IPAddress': '123.1.1.1', 'Duration': 1375816982000}], 1002: []}
+        self.counts = {}
+        self.session_id = 1
+        self.failures = []
+        self.calls = []
+        self.connections = 0
+        self.address = 'nsm.test'
+
+    # requests.Session interface
+
+    def __call__(self):
+        return self
+
+    def request(self, method, url, headers=None, verify=True, data=None):
+        return self.handle(method.upper(), '/' + url.split('/', 3)[3], headers or {}, data)
+
+    def post(self, url, headers=None, verify=True, data=None):
+        return self.request('post', url, headers, verify, data)
+
+    def close(self):
+        pass
+
+    # NSM-SDK-API
+
+    def handle(self, method, path, headers, data):
+        self.counts[method] = self.counts.get(method, 0) + 1
+        self.calls.append((method, path))
+
+        # Queued failures apply to the next requests in order, None lets a request through
+        failure = self.failures.pop(0) if self.failures else None
+        if isinstance(failure, Exception):
+            raise failure
+        if failure is not None:
+            return FakeResponse(failure, {'errorMessage': 'injected failure'})
+
+        return self.route(method, path, headers, json.loads(data) if data else None)
+
+    @property
+    def token(self):
+        return b64('SESSION%d' % self.session_id, '1')
+
+    def expire_session(self):
+        self.session_id += 1
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def route(self, method, path, headers, payload):
+        if path == '/sdkapi/session':
+            if method == 'GET':
+                if headers.get('NSM-SDK-API') != b64(self.user, self.password):
+                    return FakeResponse(401, {'errorMessage': 'Invalid credentials'})
+                return FakeResponse(200, {'session': 'SESSION%d' % self.session_id, 'userId': '1'})
+            return FakeResponse(200, {'return': 1})
+
+        if headers.get('NSM-SDK-API') != self.token:
+            return FakeResponse(401, {'errorMessage': 'Session expired'})
+
+        if path == '/sdkapi/sensors':
+            return FakeResponse(200, {'SensorDescriptor': self.sensors})
+
+        match = re.match(r'/sdkapi/sensor/(\d+)/status$', path)
+        if match:
+            return FakeResponse(200, {'status': self.status.get(int(match.group(1)), 'DISCONNECTED')})
+
+        match = re.match(r'/sdkapi/sensor/(\d+)/action/quarantinehost(?:/(.+))?$', path)
+        if match:
+            hosts = self.qhosts.setdefault(int(match.group(1)), [])
+            if method == 'GET':
+                return FakeResponse(200, {'QuarantineHostDescriptor': hosts})
+            if method == 'POST':
+                hosts.append({'IPAddress': payload['IPAddress'], 'Duration': 1375818561000})
+                return FakeResponse(200, {'status': 1})
+            hosts[:] = [host for host in hosts if host['IPAddress'] != match.group(2)]
+            return FakeResponse(200, {'status': 1})
+
+        return FakeResponse(404, {'errorMessage': 'Not found'})
+
+
+class MockNSMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, Nagle would add delayed ACK waits to every response
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.mock.connections += 1
+
+    def answer(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length).decode('utf-8') if length else None
+        response = self.server.mock.handle(self.command, self.path, self.headers, data)
+        body = response.text.encode('utf-8')
+        self.send_response(response.status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = answer
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='session')
+def certificate(tmp_path_factory):
+    '''
+    Self-signed certificate for the HTTPS mock, None when openssl is not available
+    '''
+    if not shutil.which('openssl'):
+        return None
+    path = tmp_path_factory.mktemp('tls')
+    cert, key = str(path / 'cert.pem'), str(path / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=127.0.0.1', '-keyout', key, '-out', cert],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def serve_https(mock, certificate):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockNSMHandler)
+    server.daemon_threads = True
+    server.mock = mock
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    mock.address = '127.0.0.1:%d' % server.server_address[1]
+    return server
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'http: serve the mock NSM over HTTPS on 127.0.0.1')
+    # nsmcli does not verify the NSM certificate, as disabled at import time
+    config.addinivalue_line('filterwarnings', 'ignore::urllib3.exceptions.InsecureRequestWarning')
+
+
+def pytest_collection_modifyitems(items):
+    # The baseline is measured over the network path
+    for item in items:
+        if 'baseline' in getattr(item, 'fixturenames', ()):
+            item.add_marker(pytest.mark.http)
+
+
+@pytest.fixture
+def mock_nsm(request, monkeypatch, certificate):
+    '''
+    MockNSM replacing requests.Session, or served over HTTPS for the tests marked http.
+    Without openssl the http tests fall back to the replaced session.
+    '''
+    mock = MockNSM()
+    if request.node.get_closest_marker('http') and certificate:
+        server = serve_https(mock, certificate)
+        request.addfinalizer(server.server_close)
+        request.addfinalizer(server.shutdown)
+    else:
+        monkeypatch.setattr(nsmcli.requests, 'Session', mock)
+    return mock
+
+
+@pytest.fixture
+def connected(mock_nsm):
+    myNSM = nsmcli.nsm(mock_nsm.address)
+    myNSM.connect(MockNSM.user, MockNSM.password)
+    myNSM.get_sensors()
+    mock_nsm.counts.clear()
+    return myNSM
+
+
+@pytest.fixture
+def run_cli(mock_nsm, monkeypatch, capsys):
+    '''
+    Run nsmcli.main() with the given switches against the mock, returning stdout
+    and the number of requests per HTTP method. stdout and stderr are also kept in
+    run_cli.out and run_cli.err for runs that exit.
+    '''
+    def run(*switches):
+        monkeypatch.setattr(sys, 'argv', ['nsmcli.py', '-u', MockNSM.user, '-p', MockNSM.password,
+                                          '-nsm', mock_nsm.address] + list(switches))
+        mock_nsm.counts.clear()
+        try:
+            nsmcli.main()
+        finally:
+            captured = capsys.readouterr()
+            run.out, run.err = captured.out, captured.err
+        return captured.out, dict(mock_nsm.counts)
+    run.out = run.err = ''
+    return run
+
+
+# Performance baseline: per-scenario request counts and timings
+
+BASELINE = []
+
+
+@pytest.fixture
+def baseline(request, mock_nsm):
+    '''
+    Time a scenario and record it with the requests and connections it made in the
+    baseline report. The mock is served over HTTPS so the timings include connection
+    setup. Set NSMCLI_BASELINE to a file name to also save the report as JSON.
+    '''
+    class Timer:
+        def __enter__(self):
+            mock_nsm.counts.clear()
+            self.connections = mock_nsm.connections
+            self.started = time.perf_counter()
+            return self
+
+        def __exit__(self, *exc):
+            self.seconds = time.perf_counter() - self.started
+            BASELINE.append({'scenario': request.node.name, 'requests': dict(mock_nsm.counts),
+                             'connections': mock_nsm.connections - self.connections,
+                             'transport': 'https' if mock_nsm.address != 'nsm.test' else 'session',
+                             'ms': round(self.seconds * 1000, 3)})
+    return Timer
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not BASELINE:
+        return
+    terminalreporter.section('nsmcli baseline')
+    for entry in BASELINE:
+        counts = ' '.join('%s=%d' % item for item in sorted(entry['requests'].items()))
+        terminalreporter.write_line('%-44s %-24s %-8s conn=%-4d %9.3f ms' % (
+            entry['scenario'], counts, entry['transport'], entry['connections'], entry['ms']))
+    if os.environ.get('NSMCLI_BASELINE'):
+        with open(os.environ['NSMCLI_BASELINE'], 'w') as f:
+            json.dump(BASELINE, f, indent=2)
@@ -0,0 +1,89 @@
+import pytest
+
+
+def test_get_sensors(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-get_sensors')
+
+    assert counts == {'GET': 4, 'DELETE': 1}
+    assert 'M2750-4pocs   1001      M-2750    192.168.0.203   7.5.3.16    7.6.14.9    1     ' in out
+    assert 'old-sensor    1002      I-1200    ********' in out
+
+
+def test_get_qhosts(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-get_qhosts')
+
+    assert counts == {'GET': 4, 'DELETE': 1}
+    assert 'Quarantined hosts for M2750-4pocs' in out
+    assert '123.1.1.1       1375816982000' in out
+    assert 'Error - getting quarantine hosts:  Sensor 1002 model I-1200 not supported' in out
+
+
+def test_get_qhosts_unknown_sensor(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-get_qhosts', '-sensor', 'nope')
+
+    assert counts == {'GET': 2, 'DELETE': 1}
+    assert 'Error - getting quarantine hosts: Sensor nope not managed by Network Security Manager' in out
+
+
+def test_quarantine(run_cli, baseline, mock_nsm):
+    with baseline():
+        out, counts = run_cli('-i', '10.10.10.100', '-quarantine')
+
+    assert counts == {'GET': 4, 'POST': 1, 'DELETE': 1}
+    assert 'Sensor  M2750-4pocs IP 10.10.10.100 quarantine for FIFTEEN_MINUTES' in out
+    assert '10.10.10.100' in [host['IPAddress'] for host in mock_nsm.qhosts[1001]]
+
+
+def test_quarantine_already_quarantined(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-i', '123.1.1.1', '-quarantine', '-sensor', 'M2750-4pocs')
+
+    assert counts == {'GET': 4, 'DELETE': 1}
+    assert 'Error - quarantine:  IP 123.1.1.1 already quarantined' in out
+
+
+def test_quarantine_without_ip(run_cli):
+    out, counts = run_cli('-quarantine')
+
+    assert counts == {'GET': 1, 'DELETE': 1}
+    assert 'Error - quarantine: set the IP address to be sent to quarantine with the switch -i' in out
+
+
+def test_remove(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-i', '123.1.1.1', '-remove', '-sensor', 'M2750-4pocs')
+
+    assert counts == {'GET': 4, 'DELETE': 2}
+    assert 'Sensor  M2750-4pocs IP 123.1.1.1 removed from quarantine' in out
+
+
+def test_remove_get_qhosts(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-i', '123.1.1.1', '-remove', '-get_qhosts', '-sensor', 'M2750-4pocs')
+
+    assert counts == {'GET': 7, 'DELETE': 2}
+    assert 'Sensor  M2750-4pocs IP 123.1.1.1 removed from quarantine' in out
+    assert '123.1.1.1       ' not in out
+
+
+def test_quarantine_get_sensors_get_qhosts(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-i', '10.10.10.101', '-quarantine', '-t', '45', '-get_sensors', '-get_qhosts',
+                              '-sensor', 'M2750-4pocs')
+
+    assert counts == {'GET': 10, 'POST': 1, 'DELETE': 1}
+    assert 'Sensor  M2750-4pocs IP 10.10.10.101 quarantine for FORTYFIVE_MINUTES' in out
+    assert '10.10.10.101    1375818561000' in out
+
+
+def test_connect_error(run_cli, mock_nsm):
+    mock_nsm.password = 'changed'
+
+    with pytest.raises(SystemExit):
+        run_cli('-get_sensors')
+
+    assert 'Error - connect:  HTTP output error: 401' in run_cli.out
+    assert mock_nsm.counts == {'GET': 1}
@@ -0,0 +1,364 @@
+import socket
+import threading
+import time
+import urllib.request
+
+import pytest
+import requests
+
+import nsmcli
+
+
+PATTERN = r'src=(\S+)'
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def quarantined(mock_nsm, sensor_id=1001):
+    return [host['IPAddress'] for host in mock_nsm.qhosts[sensor_id]]
+
+
+@pytest.fixture
+def ingestor(connected):
+    '''
+    Ingestor on the supported sensor of the mock, collecting its batches
+    '''
+    batches = []
+    made = []
+
+    def make(**kwargs):
+        kwargs.setdefault('on_batch', batches.append)
+        instance = nsmcli.Ingestor(connected, [1001], kwargs.pop('patterns', [PATTERN]), **kwargs)
+        instance.batches = batches
+        made.append(instance)
+        return instance
+    yield make
+
+    for instance in made:
+        instance.stop()
+
+
+@pytest.fixture
+def running():
+    '''
+    Run an ingestor in a background thread, stopping it at the end of the test
+    '''
+    threads = []
+
+    def start(instance):
+        thread = threading.Thread(target=instance.run, daemon=True)
+        thread.start()
+        threads.append((instance, thread))
+        return thread
+    yield start
+
+    for instance, thread in threads:
+        instance.stop()
+        thread.join(5)
+
+
+# extract
+
+def test_extract_group(ingestor):
+    instance = ingestor()
+
+    assert instance.extract('<13>Oct 19 host1 10.0.0.5 sshd: fail src=5.5.5.5 dst=6.6.6.6') == ['5.5.5.5']
+
+
+def test_extract_without_group(ingestor):
+    instance = ingestor(patterns=[r'\b(?:\d{1,3}\.){3}\d{1,3}\b'])
+
+    assert instance.extract('a 1.2.3.4 b 300.1.1.1 c 10.0.0.1') == ['1.2.3.4', '10.0.0.1']
+
+
+def test_extract_strips_punctuation(ingestor):
+    instance = ingestor(patterns=[PATTERN, r'"ip": (\S+)'])
+
+    assert instance.extract('src=1.2.3.4, src=(9.9.9.9) src=::1. {"ip": "2.2.2.2"}') == \
+        ['1.2.3.4', '9.9.9.9', '::1', '2.2.2.2']
+
+
+def test_extract_invalid(ingestor):
+    instance = ingestor()
+
+    assert instance.extract('src=300.1.1.1 src=1.2.3 src=host.example.com src=') == []
+
+
+def test_patterns_required(connected):
+    with pytest.raises(ValueError):
+        nsmcli.Ingestor(connected, [1001], [])
+
+
+@pytest.mark.parametrize('kwargs', [{'batch_size': 0}, {'batch_size': -1}, {'batch_wait': -1}, {'dedup_window': -1}])
+def test_invalid_settings(connected, kwargs):
+    with pytest.raises(ValueError):
+        nsmcli.Ingestor(connected, [1001], [PATTERN], **kwargs)
+
+
+@pytest.mark.parametrize('switches, message', [
+    (['-batch_size', '0'], '-batch_size must be at least 1'),
+    (['-batch_size', '-1'], '-batch_size must be at least 1'),
+    (['-batch_wait', '-1'], '-batch_wait can not be negative'),
+    (['-dedup', '-1'], '-dedup can not be negative'),
+])
+def test_cli_invalid_settings(run_cli, mock_nsm, switches, message):
+    with pytest.raises(SystemExit) as exit:
+        run_cli('-ingest', '-syslog_udp', '5514', '-pattern', PATTERN, *switches)
+
+    assert exit.value.code == 2
+    assert message in run_cli.err
+    assert mock_nsm.counts == {}
+
+
+def test_cli_requires_pattern(run_cli, mock_nsm):
+    with pytest.raises(SystemExit) as exit:
+        run_cli('-ingest', '-syslog_udp', '5514')
+
+    assert exit.value.code == 2
+    assert '-ingest requires at least one -pattern' in run_cli.err
+    assert mock_nsm.counts == {}
+
+
+# dedup
+
+def test_dedup_window(ingestor):
+    instance = ingestor(dedup_window=60)
+
+    assert instance.is_new('1.1.1.1', 100)
+    instance.remember('1.1.1.1', 100)
+    assert not instance.is_new('1.1.1.1', 159.9)
+    assert instance.is_new('1.1.1.1', 160)
+
+
+def test_dedup_purge(ingestor):
+    instance = ingestor(dedup_window=10)
+
+    # The 1024th address triggers the purge
+    for n in range(1023):
+        instance.remember('10.0.%d.%d' % (n // 256, n % 256), 0)
+    instance.remember('1.1.1.1', 20)
+
+    assert instance.seen == {'1.1.1.1': 20}
+
+
+def test_quarantined_ip_is_deduplicated(ingestor, mock_nsm):
+    instance = ingestor()
+
+    instance.flush(['10.0.0.1', '123.1.1.1'])
+
+    # Quarantined now and already quarantined both start the window
+    assert set(instance.seen) == {'10.0.0.1', '123.1.1.1'}
+    assert not instance.is_new('10.0.0.1', time.monotonic())
+
+
+def test_failed_ip_is_not_deduplicated(ingestor, mock_nsm):
+    instance = ingestor()
+    # sensor status and quarantine list go through, the POST fails
+    mock_nsm.failures = [None, None, requests.exceptions.ConnectionError()]
+
+    result = instance.flush(['9.9.9.9'])
+
+    assert result.failed[0].code == nsmcli.ERR_CONNECTION
+    assert instance.is_new('9.9.9.9', time.monotonic())
+
+    # The NSM is back, the next event for the IP address quarantines it
+    assert instance.flush(['9.9.9.9']).ok
+    assert '9.9.9.9' in quarantined(mock_nsm)
+    assert not instance.is_new('9.9.9.9', time.monotonic())
+
+
+def test_sensor_down_is_not_deduplicated(ingestor, mock_nsm):
+    instance = ingestor()
+    mock_nsm.status[1001] = 'DISCONNECTED'
+
+    instance.flush(['9.9.9.9'])
+
+    assert instance.seen == {}
+
+
+def test_unsupported_sensor_is_settled(connected, mock_nsm):
+    instance = nsmcli.Ingestor(connected, [1001, 1002], [PATTERN])
+
+    result = instance.flush(['9.9.9.9'])
+
+    assert result.failed[0].code == nsmcli.ERR_UNSUPPORTED_SENSOR
+    assert '9.9.9.9' in instance.seen
+
+
+# session expiry
+
+def test_reconnect_on_expired_session(ingestor, mock_nsm):
+    instance = ingestor()
+    mock_nsm.expire_session()
+
+    result = instance.flush(['9.9.9.9'])
+
+    assert result.ok
+    assert '9.9.9.9' in quarantined(mock_nsm)
+    assert ('GET', '/sdkapi/session') in mock_nsm.calls
+
+
+def test_reconnect_failure(ingestor, mock_nsm):
+    instance = ingestor()
+    mock_nsm.expire_session()
+    mock_nsm.password = 'changed'
+    del mock_nsm.calls[:]
+
+    result = instance.flush(['9.9.9.9'])
+
+    assert result.failed[0].status_code == 401
+    assert mock_nsm.calls.count(('GET', '/sdkapi/session')) == 1
+    assert instance.seen == {}
+
+
+# batching
+
+def test_batch_by_size(ingestor, running):
+    instance = ingestor(batch_size=3, batch_wait=30)
+    running(instance)
+
+    instance.submit('src=10.0.0.1 src=10.0.0.2 src=10.0.0.1 src=10.0.0.3 src=10.0.0.4')
+
+    assert wait_for(lambda: instance.batches)
+    assert [result.ip_address for result in instance.batches[0]] == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+
+
+def test_batch_by_wait(ingestor, running):
+    instance = ingestor(batch_size=100, batch_wait=0.2)
+    running(instance)
+    started = time.monotonic()
+
+    instance.submit('src=10.0.0.1 src=10.0.0.2')
+
+    assert wait_for(lambda: instance.batches)
+    assert time.monotonic() - started >= 0.2
+    assert len(instance.batches[0]) == 2
+
+
+def test_stop_drains_queue(ingestor, running, mock_nsm):
+    instance = ingestor(batch_size=100, batch_wait=30)
+    thread = running(instance)
+    instance.submit('src=10.0.0.1')
+    assert wait_for(lambda: instance.pending)
+    instance.submit('src=10.0.0.2')
+
+    instance.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert {'10.0.0.1', '10.0.0.2'} <= set(quarantined(mock_nsm))
+
+
+def test_queue_full(ingestor):
+    instance = ingestor(max_queue=2)
+
+    assert instance.submit('src=10.0.0.1 src=10.0.0.2')
+    assert not instance.submit('src=10.0.0.3')
+    assert instance.dropped == 1
+
+
+# listeners
+
+def test_syslog_udp(ingestor, running, mock_nsm):
+    instance = ingestor(batch_wait=0.05)
+    server = instance.listen_syslog_udp(0)
+    running(instance)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+        client.sendto(b'<13>Oct 19 host1 sshd: fail src=10.1.1.1', server.server_address)
+
+    assert wait_for(lambda: '10.1.1.1' in quarantined(mock_nsm))
+
+
+def test_syslog_tcp(ingestor, running, mock_nsm):
+    instance = ingestor(batch_wait=0.05)
+    server = instance.listen_syslog_tcp(0)
+    running(instance)
+
+    with socket.create_connection(server.server_address) as client:
+        client.sendall(b'<13>a src=10.2.2.1\n<13>b src=10.2.2.2\n')
+
+    assert wait_for(lambda: {'10.2.2.1', '10.2.2.2'} <= set(quarantined(mock_nsm)))
+
+
+def test_syslog_tcp_line_limit(ingestor, running, mock_nsm):
+    instance = ingestor(batch_wait=0.05)
+    instance.max_body = 64
+    server = instance.listen_syslog_tcp(0)
+    running(instance)
+
+    with socket.create_connection(server.server_address, timeout=5) as client:
+        client.sendall(b'<13>a src=10.2.3.1\n' + b'x' * 200 + b' src=10.2.3.2\n')
+        # The server closes the connection at the line over the limit
+        assert client.recv(1) == b''
+
+    assert wait_for(lambda: '10.2.3.1' in quarantined(mock_nsm))
+    assert '10.2.3.2' not in quarantined(mock_nsm)
+
+
+def test_dropped_count_is_thread_safe(ingestor):
+    instance = ingestor(max_queue=1)
+    instance.submit('src=10.0.0.1')
+
+    def flood():
+        for _ in range(2000):
+            instance.submit('src=10.0.0.2')
+    threads = [threading.Thread(target=flood) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert instance.dropped == 8 * 2000
+
+
+def test_webhook(ingestor, running, mock_nsm):
+    instance = ingestor(batch_wait=0.05, patterns=[r'"src": "([^"]+)"'])
+    server = instance.listen_webhook(0)
+    running(instance)
+
+    request = urllib.request.Request('http://127.0.0.1:%d/hook' % server.server_address[1],
+                                     data=b'{"src": "10.3.3.1", "dst": "10.3.3.9"}')
+    assert urllib.request.urlopen(request).status == 202
+
+    assert wait_for(lambda: '10.3.3.1' in quarantined(mock_nsm))
+    assert '10.3.3.9' not in quarantined(mock_nsm)
+
+
+def raw_post(server, headers, body=b''):
+    with socket.create_connection(server.server_address, timeout=5) as client:
+        client.sendall(b'POST / HTTP/1.1\r\nHost: test\r\n' + headers + b'\r\n' + body)
+        return client.recv(1024).split(b' ', 2)[1]
+
+
+@pytest.mark.parametrize('headers, status', [
+    (b'Content-Length: abc\r\n', b'400'),
+    (b'Content-Length: -1\r\n', b'400'),
+    (b'', b'400'),
+    (b'Content-Length: 2000000\r\n', b'413'),
+])
+def test_webhook_bad_content_length(ingestor, headers, status):
+    instance = ingestor()
+    server = instance.listen_webhook(0)
+
+    assert raw_post(server, headers) == status
+    assert instance.events.empty()
+    server.shutdown()
+    server.server_close()
+
+
+def test_webhook_queue_full(ingestor):
+    instance = ingestor(max_queue=1)
+    server = instance.listen_webhook(0)
+
+    assert raw_post(server, b'Content-Length: 12\r\n', b'src=10.0.0.1') == b'202'
+    assert raw_post(server, b'Content-Length: 12\r\n', b'src=10.0.0.2') == b'503'
+    server.shutdown()
+    server.server_close()
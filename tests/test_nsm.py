@@ -0,0 +1,170 @@
+import pytest
+import requests
+
+import nsmcli
+from conftest import MockNSM, FakeResponse
+
+
+def test_connect_sets_session_header(mock_nsm):
+    myNSM = nsmcli.nsm('nsm.test')
+
+    header = myNSM.connect(MockNSM.user, MockNSM.password)
+
+    assert header['NSM-SDK-API'] == mock_nsm.token
+    assert myNSM.sessionheader is header
+
+
+def test_get_sensors(connected):
+    sensors = connected.get_sensors()
+
+    assert [sensor.sensor_id for sensor in sensors] == [1001, 1002]
+    assert sensors[0].name == 'M2750-4pocs'
+    assert sensors[1].ip_address is None
+    assert connected.sensors_id == [1001, 1002]
+
+
+def test_get_qhosts(connected, mock_nsm):
+    entries = connected.get_qhosts(1001)
+
+    assert [(entry.ip_address, entry.duration) for entry in entries] == [('123.1.1.1', 1375816982000)]
+    assert mock_nsm.counts == {'GET': 2}
+
+
+@pytest.mark.parametrize('sensor_id, code', [
+    (9999, nsmcli.ERR_UNKNOWN_SENSOR),
+    (1002, nsmcli.ERR_UNSUPPORTED_SENSOR),
+])
+def test_check_sensor_codes(connected, sensor_id, code):
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.get_qhosts(sensor_id)
+
+    assert error.value.code == code
+
+
+def test_check_sensor_down(connected, mock_nsm):
+    mock_nsm.status[1001] = 'DISCONNECTED'
+
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.post_qhost('10.0.0.1', 1001)
+
+    assert error.value.code == nsmcli.ERR_SENSOR_UNAVAILABLE
+
+
+def test_post_and_delete_qhost(connected, mock_nsm):
+    result = connected.post_qhost('10.0.0.1', 1001, 60)
+
+    assert result.ok
+    assert result.message == 'IP 10.0.0.1 quarantine for SIXTY_MINUTES '
+    assert mock_nsm.counts == {'GET': 2, 'POST': 1}
+
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.post_qhost('10.0.0.1', 1001)
+    assert error.value.code == nsmcli.ERR_ALREADY_QUARANTINED
+
+    assert connected.delete_qhost('10.0.0.1', 1001).message == 'IP 10.0.0.1 removed from quarantine'
+
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.delete_qhost('10.0.0.1', 1001)
+    assert error.value.code == nsmcli.ERR_NOT_QUARANTINED
+
+
+def test_quarantine_many(connected, mock_nsm, baseline):
+    ips = ['10.0.0.%d' % n for n in range(1, 51)]
+
+    with baseline():
+        batch = connected.quarantine_many(ips + ['10.0.0.1', '123.1.1.1'], [1001, 1002, 9999], 30)
+
+    # Every sensor is checked and its quarantine area read once for the whole batch
+    assert mock_nsm.counts == {'GET': 2, 'POST': 50}
+    assert len(batch) == 3 * 52
+    assert len(batch.succeeded) == 50
+    assert not batch.ok
+    codes = [result.code for result in batch.failed]
+    assert codes.count(nsmcli.ERR_ALREADY_QUARANTINED) == 2
+    assert codes.count(nsmcli.ERR_UNSUPPORTED_SENSOR) == 52
+    assert codes.count(nsmcli.ERR_UNKNOWN_SENSOR) == 52
+
+
+def test_release_many(connected, mock_nsm, baseline):
+    connected.quarantine_many(['10.0.0.1', '10.0.0.2'], [1001])
+    mock_nsm.counts.clear()
+
+    with baseline():
+        batch = connected.release_many(['10.0.0.1', '10.0.0.2', '10.0.0.3'], [1001])
+
+    assert mock_nsm.counts == {'GET': 2, 'DELETE': 2}
+    assert [result.ok for result in batch] == [True, True, False]
+    assert batch.failed[0].code == nsmcli.ERR_NOT_QUARANTINED
+
+
+def test_batch_collects_http_errors(connected, mock_nsm):
+    # status and quarantine list go through, the first POST fails
+    mock_nsm.failures = [None, None, 500]
+
+    batch = connected.quarantine_many(['10.0.0.1', '10.0.0.2'], [1001])
+
+    assert [result.code for result in batch] == [nsmcli.ERR_HTTP_STATUS, None]
+
+
+@pytest.mark.parametrize('failure, code, status_code', [
+    (500, nsmcli.ERR_HTTP_STATUS, 500),
+    (requests.exceptions.ConnectionError(), nsmcli.ERR_CONNECTION, None),
+    (requests.exceptions.Timeout(), nsmcli.ERR_TIMEOUT, None),
+])
+def test_batch_sensor_status_error(connected, mock_nsm, failure, code, status_code):
+    mock_nsm.failures = [failure]
+
+    batch = connected.quarantine_many(['10.0.0.1'], [1001])
+
+    # A failed status request keeps its own error, the sensor is not reported down
+    assert batch.failed[0].code == code
+    assert batch.failed[0].status_code == status_code
+
+
+def test_sensor_status_bad_response(connected, monkeypatch):
+    monkeypatch.setattr(connected, 'request_connect', lambda *args: FakeResponse(200, {'state': 'ACTIVE'}))
+
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.check_sensor(1001)
+
+    assert error.value.code == nsmcli.ERR_BAD_RESPONSE
+
+
+@pytest.mark.parametrize('failure, code', [
+    (requests.exceptions.ConnectionError(), nsmcli.ERR_CONNECTION),
+    (requests.exceptions.Timeout(), nsmcli.ERR_TIMEOUT),
+    (requests.exceptions.TooManyRedirects(), nsmcli.ERR_REDIRECTS),
+    (requests.exceptions.RequestException('boom'), nsmcli.ERR_UNEXPECTED),
+    (404, nsmcli.ERR_HTTP_STATUS),
+])
+def test_request_errors(connected, mock_nsm, failure, code):
+    mock_nsm.failures = [failure]
+
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.get_sensors()
+
+    assert error.value.code == code
+    if code == nsmcli.ERR_HTTP_STATUS:
+        assert error.value.status_code == 404
+
+
+@pytest.mark.parametrize('body', ['{}', '[]', 'garbage', "{'SensorDescriptor': []}"])
+def test_unparsable_output(connected, monkeypatch, body):
+    monkeypatch.setattr(connected, 'request_connect', lambda *args: FakeResponse(200, body))
+
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.get_sensors()
+    assert error.value.code == nsmcli.ERR_BAD_RESPONSE
+
+    with pytest.raises(nsmcli.NSMError) as error:
+        connected.fetch_qhosts(1001)
+    assert error.value.code == nsmcli.ERR_BAD_RESPONSE
+
+
+def test_json_output(connected, mock_nsm):
+    mock_nsm.sensors[0].update({'active': True, 'SigsetVersion': None, 'name': 'M2750-Málaga'})
+
+    sensors = connected.get_sensors()
+
+    assert sensors[0].name == 'M2750-Málaga'
+    assert sensors[0].sigset_version is None
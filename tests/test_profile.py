@@ -0,0 +1,66 @@
+import inspect
+import os
+import pstats
+
+import nsmcli
+
+
+def test_profile_report(run_cli, baseline):
+    with baseline():
+        out, counts = run_cli('-i', '10.10.10.100', '-quarantine', '-get_sensors', '-get_qhosts', '--profile')
+    err = run_cli.err
+
+    # Profiling does not change the requests made nor the normal output
+    assert counts == {'GET': 10, 'POST': 1, 'DELETE': 1}
+    assert 'Sensor  M2750-4pocs IP 10.10.10.100 quarantine for FIFTEEN_MINUTES' in out
+    assert 'Profile' not in out
+
+    for phase in ('connect', 'quarantine', 'get_sensors', 'status checks', 'get_qhosts', 'output', 'disconnect'):
+        assert '\n' + phase + ' ' in err
+    assert 'nsm.request_connect                   12' in err
+    assert 'nsm.sensor_status                      4' in err
+    assert 'nsm.is_sensorup                        2' in err
+
+
+def test_profile_without_switch(run_cli):
+    run_cli('-get_sensors')
+
+    assert run_cli.err == ''
+
+
+def test_profile_output_files(run_cli, tmp_path):
+    prefix = str(tmp_path / 'run')
+
+    run_cli('-get_qhosts', '--cprofile', '--profile_out', prefix)
+
+    with open(prefix + '.folded') as f:
+        folded = dict(line.rsplit(' ', 1) for line in f.read().splitlines())
+    assert 'connect;nsm.connect;nsm.request_connect' in folded
+    assert 'get_qhosts;nsm.get_qhosts;nsm.fetch_qhosts;nsm.request_connect' in folded
+    assert all(int(value) >= 0 for value in folded.values())
+
+    assert os.path.exists(prefix + '.pstats')
+    pstats.Stats(prefix + '.pstats')
+    assert 'Folded stacks written to %s.folded' % prefix in run_cli.err
+
+
+def test_tracemalloc_leaves_out_profiler(run_cli):
+    run_cli('-get_sensors', '--tracemalloc')
+    err = run_cli.err
+
+    lines, first = inspect.getsourcelines(nsmcli.Profiler)
+    report = err.split('Top memory allocations', 1)[1]
+    for lineno in range(first, first + len(lines)):
+        assert '%s:%d:' % (nsmcli.__file__, lineno) not in report
+    assert 'Peak KiB' in err
+
+
+def test_profile_connect_error(run_cli, mock_nsm):
+    mock_nsm.password = 'changed'
+
+    try:
+        run_cli('--profile')
+    except SystemExit:
+        pass
+
+    assert '\nconnect ' in run_cli.err